@@ -1,7 +1,6 @@
 # example entrypoint for the plugin
 
 from typing import Iterable, Tuple, Any, List
-import itertools
 
 
 def configure() -> Iterable[Iterable[Tuple[str, Any]]]:
@@ -11,12 +10,12 @@ def configure() -> Iterable[Iterable[Tuple[str, Any]]]:
         Iterable[Iterable[Tuple[str, str]]]: A sequence of sequences of key, value pairs
     """
     sweep = []
+    sizes = (32, 64)
     for num_layers in range(1, 4):
-        for num_hidden in itertools.product((32, 64), repeat=num_layers):
-            sweep.append({
-                'num_layers' : num_layers,
-                'num_hidden' : list(num_hidden),
-            }.items())
+        # each bit of the mask selects the size of one layer, the first layer being the most significant bit
+        for mask in range(1 << num_layers):
+            num_hidden = [sizes[(mask >> (num_layers - 1 - layer)) & 1] for layer in range(num_layers)]
+            sweep.append((('num_layers', num_layers), ('num_hidden', num_hidden)))
     return sweep
 
 def configure_batch_norm() -> Iterable[Iterable[Tuple[str, Any]]]:
@@ -1,10 +1,12 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 
-import itertools, more_itertools
+import hashlib, itertools, more_itertools
 import logging
+import sys
 from pathlib import Path
-from typing import Any, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Callable, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from hydra.types import HydraContext
 from hydra.core.config_store import ConfigStore
@@ -18,7 +20,7 @@ from omegaconf import DictConfig, OmegaConf
 
 from hydra.utils import get_method
 
-from .utils import merge_overrides, compress_override
+from .utils import merge_overrides, compress_and_format_override, strip_override_prefix
 
 # IMPORTANT:
 # If your plugin imports any module that takes more than a fraction of a second to import,
@@ -42,6 +44,9 @@ class SweeperConfig:
     entrypoints: List[str] = field(default_factory=list)
     # whether to remove duplicate configurations
     remove_duplicates: bool = False
+    # max number of batches to launch concurrently (at least 1), only use > 1 if the launcher is thread safe.
+    # batches are launched in rounds that are validated before any of their batches is launched
+    parallel_chunks: int = 1
 
 
 ConfigStore.instance().store(group="hydra/sweeper", name="python", node=SweeperConfig)
@@ -49,14 +54,21 @@ ConfigStore.instance().store(group="hydra/sweeper", name="python", node=SweeperC
 
 class PythonSweeper(Sweeper):
     
-    def __init__(self, max_batch_size: Optional[int], entrypoints: Sequence[str], remove_duplicates: bool):
+    def __init__(self, max_batch_size: Optional[int], entrypoints: Sequence[str], remove_duplicates: bool,
+                 parallel_chunks: int = 1):
+        if parallel_chunks < 1:
+            raise ValueError(f"parallel_chunks must be at least 1, got {parallel_chunks}")
         self.max_batch_size = max_batch_size
         self.entrypoints: Sequence[str] = entrypoints
         self.remove_duplicates: bool = remove_duplicates
+        self.parallel_chunks: int = parallel_chunks
         self.config: Optional[DictConfig] = None
         self.launcher: Optional[Launcher] = None
         self.hydra_context: Optional[HydraContext] = None
         self.job_results = None
+        self._entrypoint_methods: Optional[List[Callable[[], Iterable[Iterable[Tuple[str, Any]]]]]] = None
+        self._python_overrides_cache: Optional[Tuple[Tuple[Tuple[str, str], ...], ...]] = None
+        self._saved_config_hash: Optional[bytes] = None
 
     def setup(
         self,
@@ -70,60 +82,110 @@ class PythonSweeper(Sweeper):
             hydra_context=hydra_context, task_function=task_function, config=config
         )
         self.hydra_context = hydra_context
+        self._entrypoint_methods = None
+        self._python_overrides_cache = None
+        self._get_entrypoint_methods() # fail early on entrypoints that can not be resolved
         
     def __repr__(self) -> str:
         return (
             f"PythonSweeper(max_batch_size={self.max_batch_size!r}, "
-            f"entrypoint={self.entrypoints!r})"
+            f"entrypoint={self.entrypoints!r}, "
+            f"remove_duplicates={self.remove_duplicates!r}, "
+            f"parallel_chunks={self.parallel_chunks!r})"
         )
 
     def _save_sweep_config(self):
-        # Save sweep run config in top level sweep working directory
+        # Save sweep run config in top level sweep working directory, unless the same config was already saved there
         sweep_dir = Path(self.config.hydra.sweep.dir)
+        sweep_config = sweep_dir / "multirun.yaml"
+        config_yaml = OmegaConf.to_yaml(self.config)
+        config_hash = hashlib.blake2b(config_yaml.encode("utf-8")).digest()
+        if config_hash == self._saved_config_hash and sweep_config.exists():
+            return
         sweep_dir.mkdir(parents=True, exist_ok=True)
-        OmegaConf.save(self.config, sweep_dir / "multirun.yaml")
+        sweep_config.write_text(config_yaml, encoding="utf-8")
+        self._saved_config_hash = config_hash
 
-    def _make_cli_overrides(self, cli_overrides: List[Override]) -> List[Tuple[str, str]]:
-        """ Gets all overrides from the command line interface as key, value pairs. """
-        lists = []
+    def _make_cli_overrides(self, cli_overrides: List[Override]) -> Tuple[FrozenSet[str], Iterator[Tuple[str, ...]]]:
+        """ Gets the stripped keys of all overrides from the command line interface and lazily all combinations
+        of their formatted overrides. """
+        keys, lists, keep = set(), [], []
         for override in cli_overrides:
+            key = override.get_key_element()
             if override.is_sweep_override():
                 sweep_choices = override.sweep_string_iterator()
-                key = override.get_key_element()
-                sweep = [(key, val) for val in sweep_choices]
-                lists.append(sweep)
             else:
-                key = override.get_key_element()
-                val = override.get_value_element_as_str()
-                lists.append([(key, val)])
-        return list(itertools.product(*lists))
+                sweep_choices = [override.get_value_element_as_str()]
+            # format each choice once instead of once per combination
+            choices = [f"{key}={val}" for val in sweep_choices]
+            if self.remove_duplicates:
+                choices = list(more_itertools.unique_everseen(choices))
+            # the keys are the same for all combinations, so they are only compressed once:
+            # the first override of a key wins, later ones only repeat combinations
+            stripped_key = sys.intern(strip_override_prefix(key))
+            keep.append(stripped_key not in keys)
+            if not keep[-1] and self.remove_duplicates:
+                choices = choices[:1]
+            keys.add(stripped_key)
+            lists.append(choices)
+        combinations = itertools.product(*lists)
+        if not all(keep):
+            combinations = (tuple(itertools.compress(combination, keep)) for combination in combinations)
+        return frozenset(keys), combinations
                 
-    def _make_python_overrides(self) -> Sequence[List[List[Tuple[str, str]]]]:
-        """ Gets all overrides from the python entrypoint. """
-        result = [[[]]]
-        for entrypoint in self.entrypoints:
-            method = get_method(entrypoint)
-            result.append([tuple(overrides) for overrides in method()])
-        return result
-    
-    def _make_batches(self, cli_overrides: List[Override]) -> List[Tuple[str]]:
-        """ Makes the batches. """
-        batches = merge_overrides(self._make_cli_overrides(cli_overrides),
-                                  *self._make_python_overrides())
-        batches = [tuple(f"{key}={value}" for key, value in batch) for batch in map(compress_override, batches)]
+    def _get_entrypoint_methods(self) -> List[Callable[[], Iterable[Iterable[Tuple[str, Any]]]]]:
+        """ Gets the methods of all python entrypoints. They do not change during the lifetime of the sweeper and are
+        hence only resolved once. """
+        if self._entrypoint_methods is None:
+            self._entrypoint_methods = [get_method(entrypoint) for entrypoint in self.entrypoints]
+        return self._entrypoint_methods
+
+    def _make_python_overrides(self) -> Tuple[Tuple[Tuple[str, str], ...], ...]:
+        """ Gets all overrides from the python entrypoints as pairs of stripped key and formatted override.
+        The entrypoints are only invoked once, subsequent calls return the cached overrides. """
+        if self._python_overrides_cache is None:
+            # tuples are reused as is by itertools.product, which would otherwise copy each entrypoint's overrides
+            entrypoint_overrides = [tuple(map(tuple, method())) for method in self._get_entrypoint_methods()]
+            python_overrides = map(compress_and_format_override, merge_overrides(*entrypoint_overrides))
+            if self.remove_duplicates:
+                python_overrides = more_itertools.unique_everseen(python_overrides)
+            self._python_overrides_cache = tuple(python_overrides)
+        return self._python_overrides_cache
+
+    def _make_batches(self, cli_overrides: List[Override]) -> Iterator[Tuple[str, ...]]:
+        """ Lazily makes the batches, i.e. the cartesian product of command line and python overrides.
+        If duplicates are removed, they are skipped while generating the batches. """
+        cli_keys, cli_combinations = self._make_cli_overrides(cli_overrides)
+        if not self.entrypoints:
+            # the only python combination is empty, there is nothing to merge
+            yield from cli_combinations
+            return
+        # the command line keys are the same for all combinations, so the python overrides that are not shadowed
+        # by the command line can be determined (and deduplicated) once for all of them
+        python_overrides = (tuple(override for key, override in python if key not in cli_keys)
+                            for python in self._make_python_overrides())
         if self.remove_duplicates:
-            batches = list(dict.fromkeys(batches)) # repsects ordering as of python 3.8
-        return batches
+            python_overrides = more_itertools.unique_everseen(python_overrides)
+        python_overrides = tuple(python_overrides)
+        # if duplicates are removed, both sides are free of them and hence so is their product
+        for cli in cli_combinations:
+            for python in python_overrides:
+                yield cli + python
     
-    def _chunk_batches(self, batches: Sequence[Sequence[str]]) -> Iterable[Sequence[Sequence[str]]]:
+    def _chunk_batches(self, batches: Iterable[Sequence[str]]) -> Iterator[List[Sequence[str]]]:
             """
             Split input to chunks of up to n items each
             """
             n = self.max_batch_size
-            if n is None or n == -1:
-                n = len(batches)
+            if n == -1:
+                n = None # a single chunk containing all batches
             return more_itertools.chunked(batches, n)
 
+    def validate_batch_is_legal(self, batch: Sequence[Sequence[str]]) -> None:
+        """ Ensures that the given batch can be composed. Composition depends on the override values, so each
+        distinct set of overrides within the batch is composed once. """
+        super().validate_batch_is_legal(list(more_itertools.unique_everseen(map(tuple, batch))))
+
     def sweep(self, arguments: List[str]) -> Any:
         assert self.config is not None
         assert self.launcher is not None
@@ -134,14 +196,29 @@ class PythonSweeper(Sweeper):
 
         parser = OverridesParser.create()
         parsed = parser.parse_overrides(arguments)
-        batches = self._make_batches(parsed)
-        self.validate_batch_is_legal(batches)
-        chunked_batches = list(self._chunk_batches(batches))
+        chunks = self._make_chunks(parsed)
+        if self.parallel_chunks > 1:
+            return self._launch_parallel(chunks)
+        return [self.launcher.launch(batch, initial_job_idx=initial_job_idx) for initial_job_idx, batch in chunks]
 
-        returns = []
+    def _make_chunks(self, cli_overrides: List[Override]) -> Iterator[Tuple[int, List[Sequence[str]]]]:
+        """ Lazily makes the validated chunks of batches along with the job index of their first batch. """
         initial_job_idx = 0
-        for batch in chunked_batches:
-            results = self.launcher.launch(batch, initial_job_idx=initial_job_idx)
+        for batch in self._chunk_batches(self._make_batches(cli_overrides)):
+            self.validate_batch_is_legal(batch)
+            yield initial_job_idx, batch
             initial_job_idx += len(batch)
-            returns.append(results)
-        return returns
\ No newline at end of file
+
+    def _launch_parallel(self, chunks: Iterable[Tuple[int, Sequence[Sequence[str]]]]) -> List[Any]:
+        """ Launches batches in rounds of up to `parallel_chunks` concurrent batches. The launcher must be thread safe,
+        which is e.g. not the case for the basic launcher as it changes the working directory and logging of the
+        process. All batches of a round are made and validated before any of them is launched, so validation never
+        runs concurrently with a launch, as both compose configs through process-global hydra state. """
+        assert self.launcher is not None
+        returns = []
+        with ThreadPoolExecutor(max_workers=self.parallel_chunks) as executor:
+            for round_chunks in more_itertools.chunked(chunks, self.parallel_chunks):
+                futures = [executor.submit(self.launcher.launch, batch, initial_job_idx=initial_job_idx)
+                           for initial_job_idx, batch in round_chunks]
+                returns += [future.result() for future in futures]
+        return returns
@@ -1,16 +1,45 @@
-from typing import Iterable, Tuple, Any, List
+from typing import Dict, Iterable, Iterator, Tuple, Any, List
 import itertools
+import sys
 
-def merge_overrides(*overrides: Iterable[Iterable[Iterable[Tuple[str, Any]]]]) -> Iterable[Iterable[Tuple[str, Any]]]:
-    """ Merges any number of overrides building a cartesian product between them.
+def merge_overrides(*overrides: Iterable[Iterable[Iterable[Tuple[str, Any]]]]) -> Iterator[Tuple[Tuple[str, Any], ...]]:
+    """ Lazily merges any number of overrides building a cartesian product between them.
 
     Args:
         overrides: Iterable[Iterable[Iterable[Tuple[str, Any]]]]: An iterable of overrides to merge.
 
+    Yields:
+        Tuple[Tuple[str, Any], ...]: The merged overrides
+    """
+    for configs in itertools.product(*overrides):
+        yield tuple(itertools.chain.from_iterable(configs))
+
+def strip_override_prefix(key: str) -> str:
+    """Strips the add ('+') or force-add ('++') prefix of an override key, as all of them refer to the same key.
+
+    Args:
+        key (str): the override key
+
+    Returns:
+        str: the key without prefix
+    """
+    if key[:1] != '+':
+        return key
+    return key[2:] if key[1:2] == '+' else key[1:]
+
+def _first_override_per_key(overrides: Iterable[Tuple[str, Any]]) -> Dict[str, Tuple[str, Any]]:
+    """Maps each stripped key to its first override, later overrides of the same key are shadowed.
+
+    Args:
+        overrides (Iterable[Tuple[str, Any]]): the sequence of overrides
+
     Returns:
-        Iterable[Iterable[Tuple[str, Any]]]: The merged overrides
+        Dict[str, Tuple[str, Any]]: the first override of each stripped key, in order of occurrence
     """
-    return [sum(map(tuple, configs), start=()) for configs in itertools.product(*overrides)]
+    result = {} # respects insertion order
+    for key, value in overrides:
+        result.setdefault(strip_override_prefix(key), (key, value))
+    return result
 
 def compress_override(overrides: Iterable[Tuple[str, Any]]) -> Tuple[Tuple[str, Any]]:
     """Compresses an override sequence such that it contains no duplicate keys.
@@ -21,13 +50,16 @@ def compress_override(overrides: Iterable[Tuple[str, Any]]) -> Tuple[Tuple[str,
     Returns:
         Tuple[Tuple[str, Any]]: the compressed sequence
     """
-    result = []
-    result_keys = set()
-    for key, value in overrides:
-        if key.lstrip('+') not in result_keys:
-            result.append((key, value))
-            result_keys.add(key.lstrip('+'))
-    return tuple(result)
-    
-    
-    
+    return tuple(_first_override_per_key(overrides).values())
+
+def compress_and_format_override(overrides: Iterable[Tuple[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    """Compresses an override sequence like `compress_override` and formats the remaining overrides.
+
+    Args:
+        overrides (Iterable[Tuple[str, Any]]): the seqence to compress
+
+    Returns:
+        Tuple[Tuple[str, str], ...]: pairs of (interned) stripped key and formatted "key=value" override
+    """
+    return tuple((sys.intern(stripped_key), f"{key}={value}")
+                 for stripped_key, (key, value) in _first_override_per_key(overrides).items())
@@ -11,6 +11,14 @@ def configure_2():
         [('+bizz', 11)]
     ]
     
+def configure_duplicates():
+    return [
+        [('+bar', 0)],
+        [('+bar', 0)],
+        [('+bar', [1, 1])],
+        [('+bar', [1, 1])],
+    ]
+    
 def configure_with_subconfig():
     from .subconfigs import subconfig
     from hydra_plugins.python_sweeper_plugin.utils import merge_overrides
@@ -1,6 +1,9 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved
-from pytest import mark
+import threading
 
+from pytest import mark, raises
+
+from hydra.core.override_parser.overrides_parser import OverridesParser
 from hydra.core.plugins import Plugins
 from hydra.plugins.sweeper import Sweeper
 from hydra.test_utils.launcher_common_tests import (
@@ -9,9 +12,12 @@ from hydra.test_utils.launcher_common_tests import (
     LauncherTestSuite,
 )
 from hydra.test_utils.test_utils import TSweepRunner
+from omegaconf import OmegaConf
 
 from hydra_plugins.python_sweeper_plugin.python_sweeper import PythonSweeper
-from hydra_plugins.python_sweeper_plugin.utils import merge_overrides, compress_override
+from hydra_plugins.python_sweeper_plugin.utils import (
+    merge_overrides, compress_override, compress_and_format_override, strip_override_prefix
+)
 
 def test_merge_overrides() -> None:
     overrides0 = [
@@ -22,7 +28,7 @@ def test_merge_overrides() -> None:
         (('food', 3), ('bizz', 1)),
         (('food', 4), ('bizz', 2)),
     ]
-    merged = merge_overrides(overrides0, overrides1)
+    merged = list(merge_overrides(overrides0, overrides1))
     assert len(merged) == 4
     assert merged[0] == (('foo', 1), ('bar', 0), ('food', 3), ('bizz', 1))
     assert merged[1] == (('foo', 1), ('bar', 0), ('food', 4), ('bizz', 2))
@@ -41,6 +47,17 @@ def test_compress_overrides() -> None:
     assert compressed[1] == (('foo', 1), ('bar', 3), ('bizz', 55))
     assert compressed[2] == (('+foo', 1), ('bar', 3), ('bizz', 55))
     
+def test_strip_override_prefix() -> None:
+    assert strip_override_prefix('foo') == 'foo'
+    assert strip_override_prefix('+foo') == 'foo'
+    assert strip_override_prefix('++foo') == 'foo'
+    assert strip_override_prefix('foo+') == 'foo+'
+    assert compress_override((('++foo', 1), ('foo', 2), ('+foo', 3))) == (('++foo', 1),)
+    
+def test_compress_and_format_override() -> None:
+    overrides = (('foo', 1), ('+bar', [3, 3]), ('++foo', 2), ('bizz', 55), ('+bar', 4))
+    assert compress_and_format_override(overrides) == (('foo', 'foo=1'), ('bar', '+bar=[3, 3]'), ('bizz', 'bizz=55'))
+    
 
 def test_subconfig(hydra_sweep_runner: TSweepRunner) -> None:
     sweep = hydra_sweep_runner(
@@ -166,6 +183,143 @@ def test_remove_duplicates(hydra_sweep_runner: TSweepRunner) -> None:
         assert job_ret[0].overrides == ["foo=1", "+bar=1"]
         assert job_ret[0].cfg == {"foo": 1, "bar": 1}
         
+def test_remove_duplicates_batched(hydra_sweep_runner: TSweepRunner) -> None:
+    sweep = hydra_sweep_runner(
+        calling_file=__file__,
+        calling_module=None,
+        config_path="configs",
+        config_name="overrides.yaml",
+        task_function=None,
+        overrides=["hydra/sweeper=python", "hydra/launcher=basic", "hydra.sweeper.max_batch_size=1",
+                   "hydra.sweeper.remove_duplicates=True", "foo=1,1,2", "+bar=1,1"],
+    )
+    with sweep:
+        assert sweep.returns is not None
+        assert len(sweep.returns) == 2
+        assert sweep.returns[0][0].overrides == ["foo=1", "+bar=1"]
+        assert sweep.returns[0][0].cfg == {"foo": 1, "bar": 1}
+        assert sweep.returns[1][0].overrides == ["foo=2", "+bar=1"]
+        assert sweep.returns[1][0].cfg == {"foo": 2, "bar": 1}
+        
+def test_remove_duplicates_python(hydra_sweep_runner: TSweepRunner) -> None:
+    sweep = hydra_sweep_runner(
+        calling_file=__file__,
+        calling_module=None,
+        config_path="configs",
+        config_name="overrides.yaml",
+        task_function=None,
+        overrides=["hydra/sweeper=python", "hydra/launcher=basic", "hydra.sweeper.remove_duplicates=True",
+                   "hydra.sweeper.entrypoints=[configs.overrides.configure_duplicates]", "foo=1"],
+    )
+    with sweep:
+        assert sweep.returns is not None
+        job_ret = sweep.returns[0]
+        assert len(job_ret) == 2
+        assert job_ret[0].overrides == ["foo=1", "+bar=0"]
+        assert job_ret[0].cfg == {"foo": 1, "bar": 0}
+        assert job_ret[1].overrides == ["foo=1", "+bar=[1, 1]"]
+        assert job_ret[1].cfg == {"foo": 1, "bar": [1, 1]}
+        
+def test_remove_duplicates_shadowed(hydra_sweep_runner: TSweepRunner) -> None:
+    sweep = hydra_sweep_runner(
+        calling_file=__file__,
+        calling_module=None,
+        config_path="configs",
+        config_name="overrides.yaml",
+        task_function=None,
+        overrides=["hydra/sweeper=python", "hydra/launcher=basic", "hydra.sweeper.remove_duplicates=True",
+                   "hydra.sweeper.entrypoints=[configs.overrides.configure_cli_overrides_python]", "+bar=5,6"],
+    )
+    with sweep:
+        assert sweep.returns is not None
+        job_ret = sweep.returns[0]
+        assert len(job_ret) == 2
+        assert job_ret[0].overrides == ["+bar=5", "foo=33"]
+        assert job_ret[0].cfg == {"foo": 33, "bar": 5}
+        assert job_ret[1].overrides == ["+bar=6", "foo=33"]
+        assert job_ret[1].cfg == {"foo": 33, "bar": 6}
+        
+def test_validate_duplicates_once_per_chunk(hydra_sweep_runner: TSweepRunner, monkeypatch) -> None:
+    validated = []
+    validate_batch_is_legal = Sweeper.validate_batch_is_legal
+    def record_batch(self, batch):
+        validated.extend(batch)
+        validate_batch_is_legal(self, batch)
+    monkeypatch.setattr(Sweeper, "validate_batch_is_legal", record_batch)
+    sweep = hydra_sweep_runner(
+        calling_file=__file__,
+        calling_module=None,
+        config_path="configs",
+        config_name="overrides.yaml",
+        task_function=None,
+        overrides=["hydra/sweeper=python", "hydra/launcher=basic", "hydra.sweeper.max_batch_size=3", "foo=1,2,1,2,1"],
+    )
+    with sweep:
+        assert sweep.returns is not None
+        assert sum(map(len, sweep.returns)) == 5
+        # duplicates are only composed once per chunk
+        assert validated == [("foo=1",), ("foo=2",), ("foo=2",), ("foo=1",)]
+        
+def test_entrypoints_without_setup() -> None:
+    sweeper = PythonSweeper(max_batch_size=None, entrypoints=["configs.overrides.configure_2"], remove_duplicates=False)
+    batches = list(sweeper._make_batches(OverridesParser.create().parse_overrides(["foo=1"])))
+    assert batches == [("foo=1", "+bizz=1"), ("foo=1", "+bizz=11")]
+        
+def test_parallel_chunks(tmp_path, monkeypatch) -> None:
+    class BlockingLauncher:
+        def __init__(self):
+            # chunks only get past the barrier if two of them are launched at the same time
+            self.barrier = threading.Barrier(2, timeout=10)
+            self.lock = threading.Lock()
+            self.running = 0
+            self.max_running = 0
+        
+        def launch(self, batch, initial_job_idx):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            try:
+                self.barrier.wait()
+            finally:
+                with self.lock:
+                    self.running -= 1
+            return [(initial_job_idx + idx, overrides) for idx, overrides in enumerate(batch)]
+    
+    sweeper = PythonSweeper(max_batch_size=2, entrypoints=[], remove_duplicates=False, parallel_chunks=2)
+    sweeper.config = OmegaConf.create({"hydra": {"sweep": {"dir": str(tmp_path)}}})
+    sweeper.launcher = BlockingLauncher()
+    monkeypatch.setattr(sweeper, "validate_batch_is_legal", lambda batch: None)
+    returns = sweeper.sweep(["foo=1,2,3,4,5,6,7"])
+    assert sweeper.launcher.max_running == 2
+    assert returns == [
+        [(0, ("foo=1",)), (1, ("foo=2",))],
+        [(2, ("foo=3",)), (3, ("foo=4",))],
+        [(4, ("foo=5",)), (5, ("foo=6",))],
+        [(6, ("foo=7",))],
+    ]
+        
+def test_parallel_chunks_config() -> None:
+    sweeper = PythonSweeper(max_batch_size=2, entrypoints=[], remove_duplicates=True, parallel_chunks=3)
+    assert repr(sweeper) == ("PythonSweeper(max_batch_size=2, entrypoint=[], remove_duplicates=True, "
+                             "parallel_chunks=3)")
+    with raises(ValueError):
+        PythonSweeper(max_batch_size=2, entrypoints=[], remove_duplicates=False, parallel_chunks=0)
+        
+def test_save_sweep_config_once(tmp_path) -> None:
+    sweeper = PythonSweeper(max_batch_size=None, entrypoints=[], remove_duplicates=False)
+    sweeper.config = OmegaConf.create({"hydra": {"sweep": {"dir": str(tmp_path)}}})
+    sweeper._save_sweep_config()
+    assert OmegaConf.load(tmp_path / "multirun.yaml") == sweeper.config
+    (tmp_path / "multirun.yaml").write_text("unchanged")
+    sweeper._save_sweep_config()
+    assert (tmp_path / "multirun.yaml").read_text() == "unchanged"
+    sweeper.config.foo = 1
+    sweeper._save_sweep_config()
+    assert OmegaConf.load(tmp_path / "multirun.yaml") == sweeper.config
+    (tmp_path / "multirun.yaml").unlink()
+    sweeper._save_sweep_config()
+    assert OmegaConf.load(tmp_path / "multirun.yaml") == sweeper.config
+        
 def test_entrypoints(hydra_sweep_runner: TSweepRunner) -> None:
     sweep = hydra_sweep_runner(
         calling_file=__file__,